@@ -1,10 +1,14 @@
 
 # Simple SQLite helpers. Creates tables if missing and provides helper functions.
 
+import queue
 import sqlite3
-from contextlib import closing
+import threading
+from contextlib import closing, contextmanager, nullcontext
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Optional, Tuple
+
+from utils import parse_utc
 
 DB_PATH = Path(__file__).parent / "booking.db"
 
@@ -14,7 +18,8 @@ CREATE TABLE IF NOT EXISTS classes (
     name TEXT NOT NULL,
     instructor TEXT NOT NULL,
     start_utc TEXT NOT NULL,
-    capacity INTEGER NOT NULL
+    capacity INTEGER NOT NULL,
+    start_epoch INTEGER
 );
 
 CREATE TABLE IF NOT EXISTS bookings (
@@ -25,101 +30,234 @@ CREATE TABLE IF NOT EXISTS bookings (
     booked_at_utc TEXT NOT NULL,
     FOREIGN KEY(class_id) REFERENCES classes(id)
 );
+
+CREATE INDEX IF NOT EXISTS idx_bookings_class_id ON bookings(class_id);
+CREATE INDEX IF NOT EXISTS idx_bookings_email ON bookings(email);
+"""
+
+
+# Per-connection tuning. journal_mode=WAL is persistent in the db file and is
+# set once in init_db; the rest only live as long as the connection does.
+PRAGMAS = """
+PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-64000;
+PRAGMA busy_timeout=5000;
+PRAGMA mmap_size=134217728;
 """
 
 
+def _is_file_db() -> bool:
+    return str(DB_PATH) != ":memory:"
+
+
 def get_conn():
-    conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
+    conn = sqlite3.connect(str(DB_PATH), check_same_thread=False, isolation_level=None)
     conn.row_factory = sqlite3.Row
+    if _is_file_db():
+        conn.executescript(PRAGMAS)
     return conn
 
 
+# Small pool of long-lived connections so SQLite's page and statement caches
+# survive between requests. Writes are serialized with a lock.
+POOL_SIZE = 8
+_POOL = queue.LifoQueue(maxsize=POOL_SIZE)
+_WRITE_LOCK = threading.Lock()
+
+
+@contextmanager
+def _acquire(write: bool = False):
+    try:
+        conn = _POOL.get_nowait()
+    except queue.Empty:
+        conn = get_conn()
+    try:
+        with _WRITE_LOCK if write else nullcontext():
+            yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            _POOL.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+# Schema versions, tracked in PRAGMA user_version:
+#   1 - classes.start_epoch added and backfilled
+#   2 - booking emails lowercased so lookups can use idx_bookings_email directly
+SCHEMA_VERSION = 2
+
+
+def _migrate(cur):
+    # BEGIN IMMEDIATE takes the write lock up front, so when several workers
+    # start at once only one of them applies each step; the rest wait
+    # (busy_timeout) and then see the bumped version.
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        version = cur.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            columns = {r["name"] for r in cur.execute("PRAGMA table_info(classes)")}
+            if "start_epoch" not in columns:
+                cur.execute("ALTER TABLE classes ADD COLUMN start_epoch INTEGER")
+            cur.execute(
+                "UPDATE classes SET start_epoch = CAST(strftime('%s', start_utc) AS INTEGER) WHERE start_epoch IS NULL"
+            )
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_classes_start ON classes(start_epoch)")
+        if version < 2:
+            # Folded with str.lower() to match BookRequest (SQLite's lower()
+            # only handles ASCII).
+            rows = cur.execute("SELECT id, email FROM bookings").fetchall()
+            cur.executemany(
+                "UPDATE bookings SET email = ? WHERE id = ?",
+                [(r["email"].lower(), r["id"]) for r in rows if r["email"] != r["email"].lower()],
+            )
+            cur.execute("DROP INDEX IF EXISTS idx_bookings_email_lower")
+        if version < SCHEMA_VERSION:
+            cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        cur.execute("COMMIT")
+    except Exception:
+        cur.execute("ROLLBACK")
+        raise
+
+
 def init_db():
     conn = get_conn()
     with closing(conn):
         cur = conn.cursor()
         cur.executescript(SCHEMA)
+        _migrate(cur)
+        if _is_file_db():
+            cur.execute("PRAGMA journal_mode=WAL")
         conn.commit()
 
 
+INSERT_CLASS_SQL = (
+    "INSERT INTO classes (name, instructor, start_utc, capacity, start_epoch) VALUES (?, ?, ?, ?, ?)"
+)
+
+
+def _start_epoch(start_utc: str) -> int:
+    return int(parse_utc(start_utc).timestamp())
+
+
 def insert_class(name: str, instructor: str, start_utc: str, capacity: int) -> int:
-    conn = get_conn()
-    with closing(conn):
+    with _acquire(write=True) as conn:
         cur = conn.cursor()
         cur.execute(
-            "INSERT INTO classes (name, instructor, start_utc, capacity) VALUES (?, ?, ?, ?)",
-            (name, instructor, start_utc, capacity),
+            INSERT_CLASS_SQL,
+            (name, instructor, start_utc, capacity, _start_epoch(start_utc)),
         )
         conn.commit()
         return cur.lastrowid
 
 
-def list_classes() -> List[Dict[str, Any]]:
-    conn = get_conn()
-    with closing(conn):
+def insert_classes_bulk(rows: List[tuple]) -> None:
+    """Insert many (name, instructor, start_utc, capacity) rows in one transaction."""
+    with _acquire(write=True) as conn:
+        cur = conn.cursor()
+        cur.execute("BEGIN")
+        cur.executemany(
+            INSERT_CLASS_SQL,
+            [(*row, _start_epoch(row[2])) for row in rows],
+        )
+        conn.commit()
+
+
+def list_classes() -> List[sqlite3.Row]:
+    with _acquire() as conn:
         cur = conn.cursor()
         cur.execute("SELECT * FROM classes ORDER BY start_utc")
-        rows = cur.fetchall()
-        return [dict(r) for r in rows]
+        return cur.fetchall()
 
 
-def get_class(class_id: int):
-    conn = get_conn()
-    with closing(conn):
+def list_upcoming_classes(now_ts: int) -> List[sqlite3.Row]:
+    """List classes starting at or after `now_ts` (unix seconds), with their
+    booking count (`booked`), in start order."""
+    with _acquire() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT c.id, c.name, c.instructor, c.start_utc, c.capacity,
+                   COUNT(b.id) AS booked
+            FROM classes c
+            LEFT JOIN bookings b ON b.class_id = c.id
+            WHERE c.start_epoch >= ?
+            GROUP BY c.id
+            ORDER BY c.start_epoch
+            """,
+            (now_ts,),
+        )
+        return cur.fetchall()
+
+
+def get_class(class_id: int) -> Optional[sqlite3.Row]:
+    with _acquire() as conn:
         cur = conn.cursor()
         cur.execute("SELECT * FROM classes WHERE id = ?", (class_id,))
-        row = cur.fetchone()
-        return dict(row) if row else None
+        return cur.fetchone()
 
 
 def count_bookings_for_class(class_id: int) -> int:
-    conn = get_conn()
-    with closing(conn):
+    with _acquire() as conn:
         cur = conn.cursor()
-        cur.execute("SELECT COUNT(*) as c FROM bookings WHERE class_id = ?", (class_id,))
+        cur.execute(
+            "SELECT COUNT(*) as c FROM bookings INDEXED BY idx_bookings_class_id WHERE class_id = ?",
+            (class_id,),
+        )
         return cur.fetchone()[0]
 
 
-def create_booking(class_id: int, name: str, email: str, booked_at_utc: str) -> int:
-    conn = get_conn()
-    with closing(conn):
+def create_booking(class_id: int, name: str, email: str, booked_at_utc: str) -> Tuple[int, int]:
+    """Book a spot. Returns (booking_id, available_slots left after this booking).
+    Raises ValueError if the class does not exist and OverflowError if it is full."""
+    with _acquire(write=True) as conn:
         cur = conn.cursor()
-        # We'll use a transaction to avoid simple race conditions
-        cur.execute("BEGIN")
-        cur.execute("SELECT capacity FROM classes WHERE id = ?", (class_id,))
-        row = cur.fetchone()
-        if not row:
-            conn.rollback()
-            raise ValueError("Class not found")
-        capacity = row[0]
-        cur.execute("SELECT COUNT(*) FROM bookings WHERE class_id = ?", (class_id,))
-        booked = cur.fetchone()[0]
-        if booked >= capacity:
-            conn.rollback()
-            raise OverflowError("Class is full")
+        # IMMEDIATE takes the db write lock up front, so bookings from other
+        # processes cannot land between the insert and the slot count below.
+        cur.execute("BEGIN IMMEDIATE")
+        # Capacity check and insert in one statement, so there is no window
+        # between counting and inserting.
         cur.execute(
-            "INSERT INTO bookings (class_id, name, email, booked_at_utc) VALUES (?, ?, ?, ?)",
-            (class_id, name, email, booked_at_utc),
+            """
+            INSERT INTO bookings (class_id, name, email, booked_at_utc)
+            SELECT ?, ?, ?, ?
+            WHERE (SELECT COUNT(*) FROM bookings WHERE class_id = ?)
+                < (SELECT capacity FROM classes WHERE id = ?)
+            """,
+            (class_id, name, email, booked_at_utc, class_id, class_id),
         )
+        if cur.rowcount == 0:
+            cur.execute("SELECT 1 FROM classes WHERE id = ?", (class_id,))
+            if not cur.fetchone():
+                raise ValueError("Class not found")
+            raise OverflowError("Class is full")
         booking_id = cur.lastrowid
+        cur.execute(
+            """
+            SELECT capacity - (SELECT COUNT(*) FROM bookings WHERE class_id = ?)
+            FROM classes WHERE id = ?
+            """,
+            (class_id, class_id),
+        )
+        available_slots = cur.fetchone()[0]
         conn.commit()
-        return booking_id
+        return booking_id, available_slots
 
 
-def list_bookings_by_email(email: str) -> List[Dict[str, Any]]:
-    conn = get_conn()
-    with closing(conn):
+def list_bookings_by_email(email: str) -> List[sqlite3.Row]:
+    with _acquire() as conn:
         cur = conn.cursor()
         cur.execute(
             "SELECT b.*, c.name as class_name, c.start_utc as class_start_utc FROM bookings b JOIN classes c ON b.class_id = c.id WHERE b.email = ? ORDER BY b.booked_at_utc DESC",
             (email,),
         )
-        return [dict(r) for r in cur.fetchall()]
+        return cur.fetchall()
     
 def count_bookings_by_email_for_class(email: str, class_id: int) -> int:
     
-    conn = get_conn()
-    with closing(conn):
+    with _acquire() as conn:
         cur = conn.cursor()
         cur.execute(
             "SELECT COUNT(*) FROM bookings WHERE email = ? AND class_id = ?",
@@ -130,8 +268,7 @@ def count_bookings_by_email_for_class(email: str, class_id: int) -> int:
 
 def count_total_bookings_by_email(email: str) -> int:
     """Count how many total bookings this email has across all classes."""
-    conn = get_conn()
-    with closing(conn):
+    with _acquire() as conn:
         cur = conn.cursor()
         cur.execute(
             "SELECT COUNT(*) FROM bookings WHERE email = ?",
@@ -139,3 +276,10 @@ def count_total_bookings_by_email(email: str) -> int:
         )
         return cur.fetchone()[0]
 
+
+def delete_all_bookings() -> int:
+    """Remove every booking. Returns the number of rows deleted."""
+    with _acquire(write=True) as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM bookings")
+        return cur.rowcount
@@ -1,23 +1,31 @@
 from fastapi import FastAPI, HTTPException, Query, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel, EmailStr
 from typing import List
 from datetime import datetime
-import pytz
+from zoneinfo import ZoneInfoNotFoundError
+import asyncio
 import logging
-import json
-from pathlib import Path
+import os
+import time
+import jinja2
 from contextlib import asynccontextmanager
+from functools import lru_cache
 
 # Local imports
-from databases_sql import init_db, list_classes, get_class, count_bookings_for_class,count_bookings_by_email_for_class, count_total_bookings_by_email, create_booking
+from databases_sql import init_db, list_classes, list_upcoming_classes, count_bookings_by_email_for_class, count_total_bookings_by_email, create_booking, list_bookings_by_email
 from seed_data import seed_classes
 from models import BookingOut,BookRequest
+from utils import get_timezone, parse_utc, UTC
 
 # ---------- Config ----------
-DATA_FILE = Path("bookings.json")
 templates = Jinja2Templates(directory="templates")
+# Keep compiled templates on disk so workers skip the parse after a restart.
+# No directory is passed so Jinja uses its private per-user (0700) cache dir.
+templates.env.bytecode_cache = jinja2.FileSystemBytecodeCache()
+# Template change checks are off unless asked for (python main.py turns them on)
+templates.env.auto_reload = os.getenv("TEMPLATES_AUTO_RELOAD") == "1"
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("booking_api")
 
@@ -25,60 +33,52 @@ logger = logging.getLogger("booking_api")
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
-    seed_classes
-    logger.info("Database initialized and seeded.")
+    seed_classes()
+    logger.info("Database initialized and seeded with %d classes.", len(list_classes()))
     yield
     logger.info("Application shutting down.")
 
-app = FastAPI(title="Fitness Studio Booking API", lifespan=lifespan)
+app = FastAPI(title="Fitness Studio Booking API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 
-# ---------- File Helpers ----------
-def _load_bookings():
-    if DATA_FILE.exists():
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+# ---------- Time Helpers ----------
+_MONTHS = ('', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+           'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
 
-def _save_bookings(bookings):
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(bookings, f, indent=4)
+
+def _format_local(dt: datetime) -> str:
+    """Same output as strftime("%d %b %Y, %I:%M %p") without the libc/locale round-trip."""
+    hour = dt.hour % 12 or 12
+    meridiem = "AM" if dt.hour < 12 else "PM"
+    return f"{dt.day:02d} {_MONTHS[dt.month]} {dt.year}, {hour:02d}:{dt.minute:02d} {meridiem}"
+
+
+@lru_cache(maxsize=1024)
+def _localized(start_utc: str, tz: str) -> str:
+    """Return the display string in tz for a stored UTC start time.
+    Class start times never change, so each (start, tz) pair is computed once."""
+    return _format_local(parse_utc(start_utc).astimezone(get_timezone(tz)))
 
 
 # ---------- Core Booking Logic ----------
 def process_booking(req):
-    now_utc = datetime.now(pytz.UTC)
+    now_utc = datetime.now(UTC)
 
     # 1. Check if user already booked more than twice
-    bookings = _load_bookings()
-    email_bookings = [b for b in bookings if b["email"].lower() == req.email.lower()]
-    if len(email_bookings) >= 2:
+    if count_total_bookings_by_email(req.email) >= 2:
         raise HTTPException(status_code=400, detail="Booking failed – not allowed more than twice")
 
-    # 2. Check class availability
-    cls = get_class(req.class_id)
-    if not cls:
+    # 2. Save booking in DB (class existence and capacity are checked by the insert)
+    try:
+        booking_id, available_slots = create_booking(
+            req.class_id, req.name, req.email, now_utc.isoformat()
+        )
+    except ValueError:
         raise HTTPException(status_code=404, detail="Class not found")
-
-    booked_count = count_bookings_for_class(req.class_id)
-    if booked_count >= cls["capacity"]:
+    except OverflowError:
         raise HTTPException(status_code=400, detail="Booking failed – class is full")
 
-    # 3. Save booking in DB
-    booking_id = create_booking(
-        req.class_id, req.name, req.email, now_utc.isoformat()
-    )
-
-    # 4. Save booking in JSON
-    booking_data = req.dict()
-    booking_data["booked_at"] = now_utc.isoformat()
-    bookings.append(booking_data)
-    _save_bookings(bookings)
-
-    # 5. Calculate available slots
-    available_slots = cls["capacity"] - booked_count - 1
-
-    # 6. Return success response
+    # 3. Return success response
     return {
         "booking_id": booking_id,
         "message": "Booking successful!",
@@ -86,55 +86,52 @@ def process_booking(req):
     }
 # ---------- API Endpoints ----------
 @app.get("/classes")
-def list_classes_api(timezone: str = Query('Asia/Kolkata')):
+async def list_classes_api(timezone: str = Query('Asia/Kolkata')):
     try:
-        target_tz = pytz.timezone(timezone)
-    except pytz.UnknownTimeZoneError:
+        get_timezone(timezone)
+    except (ZoneInfoNotFoundError, ValueError):
         raise HTTPException(status_code=400, detail="Invalid timezone")
 
     classes = []
-    for cls in list_classes():
-        class_start_utc = datetime.fromisoformat(cls["start_utc"].replace('Z', '+00:00'))
-        local_start = class_start_utc.astimezone(target_tz)
+    for cls in await asyncio.to_thread(list_upcoming_classes, int(time.time())):
+        local_start = _localized(cls["start_utc"], timezone)
         classes.append({
             "id": cls["id"],
             "name": cls["name"],
             "instructor": cls["instructor"],
-            "start": local_start.strftime("%d %b %Y, %I:%M %p"),
-            "capacity": cls["capacity"]
+            "start": local_start,
+            "capacity": cls["capacity"],
+            "available_slots": max(0, cls["capacity"] - cls["booked"])
         })
     return classes
 
 
 @app.post("/book")
-def book_class_api(req: BookRequest):
-    return process_booking(req)
+async def book_class_api(req: BookRequest):
+    return await asyncio.to_thread(process_booking, req)
 
 
 @app.get("/bookings", response_model=List[BookingOut])
-def get_bookings_api(email: str = Query(...), tz: str = Query("Asia/Kolkata")):
+async def get_bookings_api(email: str = Query(...), tz: str = Query("Asia/Kolkata")):
     try:
-        target_tz = pytz.timezone(tz)
-    except pytz.UnknownTimeZoneError:
+        get_timezone(tz)
+    except (ZoneInfoNotFoundError, ValueError):
         raise HTTPException(status_code=400, detail="Invalid timezone")
 
-    bookings = [b for b in _load_bookings() if b["email"].lower() == email.lower()]
     out = []
 
-    for b in bookings:
-        cls = get_class(b["class_id"])
-        utc_time = datetime.fromisoformat(cls["start_utc"].replace('Z', '+00:00'))
-        local_time = utc_time.astimezone(target_tz)
+    for b in await asyncio.to_thread(list_bookings_by_email, email.lower()):
+        local_time = _localized(b["class_start_utc"], tz)
 
         out.append(
             BookingOut(
-                id=None,
+                id=b["id"],
                 class_id=b["class_id"],
-                class_name=cls["name"],
-                class_start_local=local_time.strftime("%d %b %Y, %I:%M %p"),
+                class_name=b["class_name"],
+                class_start_local=local_time,
                 name=b["name"],
                 email=b["email"],
-                booked_at_utc=b["booked_at"]
+                booked_at_utc=b["booked_at_utc"]
             )
         )
     return out
@@ -142,53 +139,46 @@ def get_bookings_api(email: str = Query(...), tz: str = Query("Asia/Kolkata")):
 
 # ---------- HTML Frontend ----------
 @app.get("/", response_class=HTMLResponse)
-def home(request: Request, tz: str = "Asia/Kolkata", message: str = None, status: str = None):
+async def home(request: Request, tz: str = "Asia/Kolkata", message: str = None, status: str = None):
     try:
-        target_tz = pytz.timezone(tz)
-    except pytz.UnknownTimeZoneError:
+        target_tz = get_timezone(tz)
+    except (ZoneInfoNotFoundError, ValueError):
         tz = "Asia/Kolkata"
-        target_tz = pytz.timezone(tz)
+        target_tz = get_timezone(tz)
 
-    now_utc = datetime.now(pytz.UTC)
     classes_data = []
 
-    for r in list_classes():
-        class_start_utc = datetime.fromisoformat(r["start_utc"].replace('Z', '+00:00'))
-        if class_start_utc < now_utc:
-            continue
-        local_start = class_start_utc.astimezone(target_tz)
+    for r in await asyncio.to_thread(list_upcoming_classes, int(time.time())):
+        local_start = _localized(r["start_utc"], tz)
 
-        bookings = [b for b in _load_bookings() if b["class_id"] == r["id"]]
-        available = max(0, r["capacity"] - len(bookings))
+        available = max(0, r["capacity"] - r["booked"])
 
         classes_data.append({
             "id": r["id"],
             "name": r["name"],
             "instructor": r["instructor"],
-            "start": local_start.strftime("%d %b %Y, %I:%M %p"),
+            "start": local_start,
             "available": available
         })
 
-    classes_data.sort(key=lambda x: datetime.strptime(x["start"], "%d %b %Y, %I:%M %p"))
-
     return templates.TemplateResponse(
+    request,
     "classes.html",
     {
-        "request": request,
         "classes": classes_data,
         "current_tz": tz, 
         "message": message,
         "status": status,
-        "now": datetime.now(target_tz).strftime("%d %b %Y, %I:%M %p") 
+        "now": _format_local(datetime.now(target_tz))
     }
 )
 
 
 
 @app.post("/book-form")
-def book_spot_form(class_id: int = Form(...), name: str = Form(...), email: str = Form(...)):
+async def book_spot_form(class_id: int = Form(...), name: str = Form(...), email: str = Form(...)):
     try:
-        process_booking(BookRequest(class_id=class_id, name=name, email=email))
+        await asyncio.to_thread(process_booking, BookRequest(class_id=class_id, name=name, email=email))
         return RedirectResponse(url=f"/?message=Booking+successful!&status=success", status_code=303)
     except HTTPException as e:
         return RedirectResponse(url=f"/?message={e.detail}&status=error", status_code=303)
@@ -206,4 +196,5 @@ templates.env.filters["datetimeformat"] = datetimeformat
 # ---------- Run ----------
 if __name__ == "__main__":
     import uvicorn
+    os.environ.setdefault("TEMPLATES_AUTO_RELOAD", "1")
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
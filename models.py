@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, ConfigDict, Field, EmailStr, field_validator
 from typing import Optional
 
 class ClassOut(BaseModel):
@@ -11,10 +11,17 @@ class ClassOut(BaseModel):
 
 
 class BookRequest(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     class_id: int
     name: str = Field(..., min_length=2)
     email: EmailStr
 
+    @field_validator("email")
+    @classmethod
+    def _lowercase_email(cls, v: str) -> str:
+        return v.lower()
+
 
 class BookingOut(BaseModel):
     id: Optional[int] = None
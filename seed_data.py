@@ -1,27 +1,19 @@
 """
 Seed three classes (Yoga, Zumba, HIIT).
 - Default: Adds missing classes only.
-- --force: Resets all classes to new times + clears bookings.json.
+- --force: Resets all classes to new times + clears all bookings.
 Times are stored as UTC strings.
 """
 
 import sys
-import os
-import json
 from datetime import datetime, timedelta
-from databases_sql import list_classes, insert_class
+from databases_sql import init_db, list_classes, insert_classes_bulk, delete_all_bookings
 from utils import to_utc, IST
 
-BOOKINGS_FILE = "bookings.json"
-
 def clear_bookings():
-    """Clear all bookings by emptying bookings.json."""
-    if os.path.exists(BOOKINGS_FILE):
-        with open(BOOKINGS_FILE, "w") as f:
-            json.dump([], f)
-        print(f"Cleared all bookings in {BOOKINGS_FILE}")
-    else:
-        print(f"No {BOOKINGS_FILE} found, nothing to clear.")
+    """Clear all bookings from the database."""
+    deleted = delete_all_bookings()
+    print(f"Cleared {deleted} bookings")
 
 def seed_classes(force=False):
     now_ist = datetime.now(IST)
@@ -37,12 +29,16 @@ def seed_classes(force=False):
     if force:
         clear_bookings()
 
-    for name, ist_time in classes:
-        if force or name not in existing_names:
-            utc_time = to_utc(ist_time)
-            insert_class(name, "Instructor", utc_time.isoformat(), 15)
-            print(f"Seeded: {name} at {ist_time.strftime('%d %b %Y, %I:%M %p')} IST")
+    to_seed = [(name, ist_time) for name, ist_time in classes if force or name not in existing_names]
+    if not to_seed:
+        return
+    insert_classes_bulk([
+        (name, "Instructor", to_utc(ist_time).isoformat(), 15) for name, ist_time in to_seed
+    ])
+    for name, ist_time in to_seed:
+        print(f"Seeded: {name} at {ist_time.strftime('%d %b %Y, %I:%M %p')} IST")
 
 if __name__ == "__main__":
     force_flag = "--force" in sys.argv
+    init_db()  # create/migrate the schema before clearing or inserting anything
     seed_classes(force=force_flag)
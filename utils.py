@@ -1,16 +1,24 @@
 """
 Utility helpers for timezone handling.
 """
-from datetime import datetime
-import pytz
+from datetime import datetime, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
 
-IST = pytz.timezone('Asia/Kolkata')
-UTC = pytz.UTC
+
+@lru_cache(maxsize=128)
+def get_timezone(name: str) -> ZoneInfo:
+    """Cached ZoneInfo lookup"""
+    return ZoneInfo(name)
+
+
+IST = get_timezone('Asia/Kolkata')
+UTC = timezone.utc
 
 def ensure_ist(dt: datetime) -> datetime:
     """Ensure datetime is IST or convert naive to IST"""
     if dt.tzinfo is None:
-        return IST.localize(dt)
+        return dt.replace(tzinfo=IST)
     if dt.tzinfo != IST:
         return dt.astimezone(IST)
     return dt
@@ -24,7 +32,13 @@ def from_utc(utc_dt: datetime, to_tz: str) -> datetime:
     """Convert UTC to any timezone"""
     if utc_dt.tzinfo != UTC:
         raise ValueError("Input must be UTC datetime")
-    return utc_dt.astimezone(pytz.timezone(to_tz))
+    return utc_dt.astimezone(get_timezone(to_tz))
+
+def parse_utc(value: str) -> datetime:
+    """Parse a stored UTC ISO-8601 string (start_utc, booked_at_utc)"""
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    return datetime.fromisoformat(value)
 
 def format_datetime(dt: datetime) -> str:
     """Format datetime with timezone abbreviation"""